@@ -1,4 +1,10 @@
+import copy
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
 import chess
+import chess.polyglot
 
 # ==============================================================  
 # Chess Feature Extractor (Class Version)
@@ -11,6 +17,163 @@ import chess
 #   features = extractor.extract_all_features()
 # ==============================================================  
 
+# ==============================================================  
+# Precomputed bitboard masks
+# ==============================================================  
+# square -> file / rank lookups, cheaper than calling chess.square_file/square_rank
+SQUARE_FILES = bytes(sq & 7 for sq in chess.SQUARES)
+SQUARE_RANKS = bytes(sq >> 3 for sq in chess.SQUARES)
+
+FILE_MASKS = [chess.BB_FILES[f] for f in range(8)]
+# squares on the same file towards rank 8, i.e. what the passed-pawn scan looks at
+FRONT_SPAN_MASKS = [
+    chess.BB_FILES[chess.square_file(sq)] & ~((chess.BB_SQUARES[sq] << 1) - 1)
+    for sq in chess.SQUARES
+]
+
+
+def _pawn_shield_mask(king_sq, color):
+    # the three squares directly in front of the king, from `color`'s side
+    file, rank = chess.square_file(king_sq), chess.square_rank(king_sq)
+    front_rank = rank + 1 if color == chess.WHITE else rank - 1
+    mask = 0
+    for f in (file - 1, file, file + 1):
+        if 0 <= f < 8 and 0 <= front_rank < 8:
+            mask |= chess.BB_SQUARES[chess.square(f, front_rank)]
+    return mask
+
+
+# indexed [color][king square]; chess.BLACK == 0, chess.WHITE == 1
+PAWN_SHIELD_MASKS = [[_pawn_shield_mask(sq, color) for sq in chess.SQUARES] for color in (chess.BLACK, chess.WHITE)]
+# where the king ends up after castling, indexed [color]
+CASTLED_KING_SQUARES = [chess.BB_G8 | chess.BB_C8, chess.BB_G1 | chess.BB_C1]
+CENTER_MASK = chess.BB_D4 | chess.BB_D5 | chess.BB_E4 | chess.BB_E5
+# the opponent's half of the board, indexed [color]
+HALF_MASKS = [
+    chess.BB_RANK_1 | chess.BB_RANK_2 | chess.BB_RANK_3 | chess.BB_RANK_4,
+    chess.BB_RANK_5 | chess.BB_RANK_6 | chess.BB_RANK_7 | chess.BB_RANK_8,
+]
+
+
+def color_attacks(board, color):
+    # every square attacked by at least one piece of `color`
+    bb = 0
+    for sq in chess.scan_forward(board.occupied_co[color]):
+        bb |= board.attacks_mask(sq)
+    return bb
+
+
+def pinned_mask(board, color):
+    # our pieces absolutely pinned to our king, from one walk over the enemy sliders lined up with it
+    king = board.king(color)
+    if king is None:
+        return 0
+    them = board.occupied_co[not color]
+    snipers = (((chess.BB_RANK_ATTACKS[king][0] | chess.BB_FILE_ATTACKS[king][0]) & (board.rooks | board.queens)) |
+               (chess.BB_DIAG_ATTACKS[king][0] & (board.bishops | board.queens))) & them
+    pinned = 0
+    for sniper in chess.scan_forward(snipers):
+        blockers = chess.between(king, sniper) & board.occupied
+        if blockers and not blockers & (blockers - 1):
+            pinned |= blockers & board.occupied_co[color]
+    return pinned
+
+
+def file_occupancy(bb):
+    # fold the ranks together: bit f of the result is set when `bb` has a square on file f
+    bb |= bb >> 32
+    bb |= bb >> 16
+    bb |= bb >> 8
+    return bb & 0xFF
+
+
+def north_fill(bb):
+    # every square strictly above some square of `bb` on the same file
+    fill = bb << 8
+    fill |= fill << 8
+    fill |= fill << 16
+    fill |= fill << 32
+    return fill & chess.BB_ALL
+
+
+def isolated_files(files):
+    # files (8-bit mask) with no neighbour in the mask
+    return chess.popcount(files & ~((files << 1) | (files >> 1)))
+
+
+class FeatureContext:
+    # per-position scratch built once and shared by the feature getters
+    def __init__(self, board):
+        self.board = board
+        self.occupied_co = board.occupied_co
+        # indexed [color], like board.occupied_co
+        self.attacks = [color_attacks(board, chess.BLACK), color_attacks(board, chess.WHITE)]
+        # color -> compute_attack_features result, filled on first use
+        self.attack_stats = {}
+
+
+# ==============================================================  
+# Flat feature schema (for model input)
+# ==============================================================  
+SIDES = ("white", "black")
+
+
+def _per_side(name, *fields):
+    if fields:
+        return [(name, side, field) for side in SIDES for field in fields]
+    return [(name, side) for side in SIDES]
+
+
+# groups that only read where these piece types stand; if those bitboards
+# match between two positions, so does the group
+PLACEMENT_GROUPS = {
+    "development": (chess.KNIGHT, chess.BISHOP),
+    "bishop_pair_bonus": (chess.BISHOP,),
+    "rook_activity": (chess.ROOK, chess.PAWN),
+    "open_file_control": (chess.ROOK, chess.QUEEN, chess.PAWN),
+    "rook_on_7th_rank": (chess.ROOK,),
+}
+
+
+def placement(board, piece_types):
+    # fingerprint of where the given piece types stand, for both colours
+    return tuple(board.pieces_mask(piece_type, color) for piece_type in piece_types for color in chess.COLORS)
+
+
+# one path into the feature dict per vector slot, in output order
+FEATURE_KEYS = tuple(
+    _per_side("material") + [("mobility",)] + _per_side("king_safety")
+    + _per_side("pawn_structure", "doubled", "isolated", "passed")
+    + _per_side("center_control") + _per_side("development") + _per_side("rook_activity")
+    + _per_side("threats") + _per_side("piece_activity") + _per_side("piece_coordination")
+    + _per_side("bishop_pair_bonus") + _per_side("open_file_control") + _per_side("space_advantage")
+    + _per_side("weak_squares") + _per_side("outposts") + _per_side("pinned_pieces")
+    + _per_side("attacked_vs_defended", "attacked", "defended")
+    + _per_side("castling_status") + _per_side("king_zone_control") + _per_side("rook_on_7th_rank")
+    + _per_side("connected_rooks") + _per_side("passed_pawn_advancement") + _per_side("pawn_shield")
+    + _per_side("backward_pawns") + _per_side("isolated_weakness_clusters")
+)
+FEATURE_INDEX = {"_".join(key): i for i, key in enumerate(FEATURE_KEYS)}
+N_FEATURES = len(FEATURE_KEYS)
+
+
+def _compile_feature_values():
+    # generate `return (f["material"]["white"], ...)` with every path spelled out,
+    # so flattening is one tuple display instead of a nested loop per call
+    slots = ", ".join("f" + "".join(f"[{part!r}]" for part in key) for key in FEATURE_KEYS)
+    namespace = {}
+    exec(f"def feature_values(f):\n    return ({slots},)\n", namespace)
+    return namespace["feature_values"]
+
+
+# the feature dict's leaves as a flat tuple, in FEATURE_KEYS order
+feature_values = _compile_feature_values()
+
+
+# non-numeric feature values and what they encode to
+CATEGORY_VALUES = {"Safe": 0.0, "Exposed": 1.0}
+
+
 # ==============================================================  
 # Chess Feature Extractor (with support for comparing prev vs curr FENs)
 # ==============================================================  
@@ -25,289 +188,389 @@ class ChessFeatureExtractor:
         chess.KING: 0
     }
 
+    tt_size = 100_000
+    pawn_tt_size = 16_384
+    fen_cache_size = 100_000
+
     def __init__(self):
-        pass  # we won’t bind a board, everything works off FENs
+        # we won’t bind a board, everything works off FENs.
+        # Transposition table: zobrist hash -> feature dict, oldest entry evicted first.
+        self._tt = {}
+        # Pawn/king table: pawn and king bitboards -> the features that only read those.
+        self._pawn_tt = {}
+        # FEN front cache so repeat FENs skip board construction altogether; least recently used evicted first.
+        self._fen_cache = {}
 
     # -------------------------------
     # MATERIAL COUNT
     # -------------------------------
     def get_material(self, board):
         white_material = black_material = 0
-        for square in chess.SQUARES:
-            piece = board.piece_at(square)
-            if piece:
-                val = self.piece_values[piece.piece_type]
-                if piece.color == chess.WHITE:
-                    white_material += val
-                else:
-                    black_material += val
+        for piece_type, val in self.piece_values.items():
+            white_material += val * chess.popcount(board.pieces_mask(piece_type, chess.WHITE))
+            black_material += val * chess.popcount(board.pieces_mask(piece_type, chess.BLACK))
         return white_material, black_material
 
     def get_mobility(self, board):
-        return len(list(board.legal_moves))
-
-    def get_king_safety(self, board, color):
-        king_sq = board.king(color)
-        castled = board.has_castling_rights(color) is False
-        unsafe = 0
-        for sq in chess.SquareSet(chess.BB_KING_ATTACKS[king_sq]):
-            if board.is_attacked_by(not color, sq):
-                unsafe += 1
+        return board.legal_moves.count()
+
+    def get_king_safety(self, board, color, ctx=None):
+        ctx = ctx or FeatureContext(board)
+        king = board.king(color)
+        castled = chess.BB_SQUARES[king] & CASTLED_KING_SQUARES[color]
+        unsafe = chess.popcount(chess.BB_KING_ATTACKS[king] & ctx.attacks[not color])
         return "Safe" if unsafe <= 2 and castled else "Exposed"
 
     def get_pawn_structure(self, board, color):
-        pawns = board.pieces(chess.PAWN, color)
-        files = [chess.square_file(sq) for sq in pawns]
-
-        doubled = sum(files.count(f) > 1 for f in set(files))
-        isolated = sum(
-            all(abs(f - other) > 1 for other in set(files) if other != f)
-            for f in set(files)
-        )
-
-        passed = 0
-        for sq in pawns:
-            rank = chess.square_rank(sq)
-            file = chess.square_file(sq)
-            blocked = False
-            for ahead in range(rank + 1, 8):
-                front = chess.square(file, ahead)
-                if board.piece_at(front) and board.piece_at(front).color != color:
-                    blocked = True
-            if not blocked:
-                passed += 1
+        pawns = board.pawns & board.occupied_co[color]
+        enemies = board.occupied_co[not color]
+
+        # a file is doubled when one of its pawns has another of ours below it
+        doubled = chess.popcount(file_occupancy(pawns & north_fill(pawns)))
+        isolated = isolated_files(file_occupancy(pawns))
+
+        passed = sum(1 for sq in chess.scan_forward(pawns) if not enemies & FRONT_SPAN_MASKS[sq])
 
         return {"doubled": doubled, "isolated": isolated, "passed": passed}
 
-    def get_center_control(self, board, color):
-        center = [chess.D4, chess.D5, chess.E4, chess.E5]
-        return sum(board.is_attacked_by(color, sq) for sq in center)
+    def get_center_control(self, board, color, ctx=None):
+        ctx = ctx or FeatureContext(board)
+        return chess.popcount(ctx.attacks[color] & CENTER_MASK)
 
     def get_development(self, board, color):
-        developed = 0
-        minors = board.pieces(chess.KNIGHT, color) | board.pieces(chess.BISHOP, color)
-        for sq in minors:
-            rank = chess.square_rank(sq)
-            if (color == chess.WHITE and rank > 0) or (color == chess.BLACK and rank < 7):
-                developed += 1
-        return developed
+        # minor pieces that have left our back rank
+        minors = (board.knights | board.bishops) & board.occupied_co[color]
+        back = chess.BB_RANK_1 if color == chess.WHITE else chess.BB_RANK_8
+        return chess.popcount(minors & ~back)
 
     def get_rook_activity(self, board, color):
-        rooks = board.pieces(chess.ROOK, color)
-        active = 0
-        for r in rooks:
-            file = chess.square_file(r)
-            has_pawn = any(board.piece_at(chess.square(file, rank)) and
-                           board.piece_at(chess.square(file, rank)).piece_type == chess.PAWN
-                           for rank in range(8))
-            if not has_pawn:
-                active += 1
-        return active
-
-    def get_hanging_pieces(self, board, color):
-        hanging = 0
-        for sq, piece in board.piece_map().items():
-            if piece.color == color:
-                if not board.is_attacked_by(color, sq) and board.is_attacked_by(not color, sq):
-                    hanging += 1
-        return hanging
-
-    def get_piece_activity(self, board, color):
-        return sum(1 for move in board.legal_moves if board.color_at(move.from_square) == color)
-
-    def get_piece_coordination(self, board, color):
-        defended = 0
-        for sq, piece in board.piece_map().items():
-            if piece.color == color and board.is_attacked_by(color, sq):
-                defended += 1
-        return defended
+        rooks = board.rooks & board.occupied_co[color]
+        return sum(1 for r in chess.scan_forward(rooks) if not board.pawns & FILE_MASKS[SQUARE_FILES[r]])
+
+    def compute_attack_features(self, board, color, ctx=None):
+        # threats, coordination and attacked-vs-defended straight from the attack maps
+        ctx = ctx or FeatureContext(board)
+        stats = ctx.attack_stats.get(color)
+        if stats is None:
+            ours, theirs = ctx.attacks[color], ctx.attacks[not color]
+            own = ctx.occupied_co[color]
+            # attacked/defended count every piece on the board, as the original piece_map walk did
+            stats = ctx.attack_stats[color] = {
+                "hanging": chess.popcount(own & theirs & ~ours),
+                "coordination": chess.popcount(own & ours),
+                "attacked": chess.popcount(board.occupied & theirs),
+                "defended": chess.popcount(board.occupied & ours),
+            }
+        return stats
+
+    def get_threat_stats(self, board, ctx=None):
+        # both colours' threat groups off one FeatureContext
+        ctx = ctx or FeatureContext(board)
+        white = self.compute_attack_features(board, chess.WHITE, ctx)
+        black = self.compute_attack_features(board, chess.BLACK, ctx)
+        return {
+            "threats": {"white": white["hanging"], "black": black["hanging"]},
+            "piece_coordination": {"white": white["coordination"], "black": black["coordination"]},
+            "attacked_vs_defended": {"white": {"attacked": white["attacked"], "defended": white["defended"]},
+                                     "black": {"attacked": black["attacked"], "defended": black["defended"]}},
+        }
+
+    def get_hanging_pieces(self, board, color, ctx=None):
+        return self.compute_attack_features(board, color, ctx)["hanging"]
+
+    def get_piece_activity(self, board, color, mobility=None):
+        # legal_moves only covers the side to move; pass the turn to count the other side
+        if color == board.turn:
+            return board.legal_moves.count() if mobility is None else mobility
+        board.push(chess.Move.null())
+        try:
+            # if the mover was in check, the null move leaves their king en prise;
+            # capturing it isn't a real move, so moves onto a king are not counted
+            return sum(1 for _ in board.generate_legal_moves(to_mask=chess.BB_ALL & ~board.kings))
+        finally:
+            board.pop()
+
+    def get_piece_coordination(self, board, color, ctx=None):
+        return self.compute_attack_features(board, color, ctx)["coordination"]
 
     def get_bishop_pair_bonus(self, board, color):
-        return 1 if len(board.pieces(chess.BISHOP, color)) >= 2 else 0
+        return 1 if chess.popcount(board.pieces_mask(chess.BISHOP, color)) >= 2 else 0
 
     def get_open_file_control(self, board, color):
-        controlled = 0
-        for piece_type in [chess.ROOK, chess.QUEEN]:
-            for sq in board.pieces(piece_type, color):
-                file = chess.square_file(sq)
-                pawns_in_file = any(
-                    board.piece_at(chess.square(file, rank)) and
-                    board.piece_at(chess.square(file, rank)).piece_type == chess.PAWN
-                    for rank in range(8)
-                )
-                if not pawns_in_file:
-                    controlled += 1
-        return controlled
-
-    def get_space_advantage(self, board, color):
-        half_ranks = range(4, 8) if color == chess.WHITE else range(0, 4)
-        control = 0
-        for rank in half_ranks:
-            for file in range(8):
-                sq = chess.square(file, rank)
-                if board.is_attacked_by(color, sq):
-                    control += 1
-        return control
-
-    def get_weak_squares(self, board, color):
-        weak = 0
-        center = [chess.D4, chess.D5, chess.E4, chess.E5]
-        for sq in center:
-            if not board.is_attacked_by(color, sq) and not board.piece_at(sq):
-                weak += 1
-        return weak
-
-    def get_outposts(self, board, color):
-        outposts = 0
-        knights = board.pieces(chess.KNIGHT, color)
-        for n in knights:
-            for sq in chess.SquareSet(chess.BB_KNIGHT_ATTACKS[n]):
-                if not board.is_attacked_by(not color, sq):
-                    outposts += 1
-        return outposts
+        heavies = (board.rooks | board.queens) & board.occupied_co[color]
+        return sum(1 for sq in chess.scan_forward(heavies) if not board.pawns & FILE_MASKS[SQUARE_FILES[sq]])
+
+    def get_space_advantage(self, board, color, ctx=None):
+        ctx = ctx or FeatureContext(board)
+        return chess.popcount(ctx.attacks[color] & HALF_MASKS[color])
+
+    def get_weak_squares(self, board, color, ctx=None):
+        ctx = ctx or FeatureContext(board)
+        return chess.popcount(CENTER_MASK & ~ctx.attacks[color] & ~board.occupied)
+
+    def get_outposts(self, board, color, ctx=None):
+        ctx = ctx or FeatureContext(board)
+        safe = ~ctx.attacks[not color]
+        return sum(chess.popcount(chess.BB_KNIGHT_ATTACKS[n] & safe)
+                   for n in chess.scan_forward(board.knights & ctx.occupied_co[color]))
 
     def get_pinned_pieces(self, board, color):
-        return sum(1 for sq in board.pieces(chess.PAWN, color) |
-                   board.pieces(chess.KNIGHT, color) |
-                   board.pieces(chess.BISHOP, color) |
-                   board.pieces(chess.ROOK, color) |
-                   board.pieces(chess.QUEEN, color)
-                   if board.is_pinned(color, sq))
-
-    def get_attacked_vs_defended_balance(self, board, color):
-        attacked = defended = 0
-        for sq, piece in board.piece_map().items():
-            if board.is_attacked_by(not color, sq):
-                attacked += 1
-            if board.is_attacked_by(color, sq):
-                defended += 1
-        return {"attacked": attacked, "defended": defended}
+        return chess.popcount(pinned_mask(board, color))
+
+    def get_attacked_vs_defended_balance(self, board, color, ctx=None):
+        stats = self.compute_attack_features(board, color, ctx)
+        return {"attacked": stats["attacked"], "defended": stats["defended"]}
 
     def get_castling_status(self, board, color):
         return board.has_castling_rights(color)
 
-    def get_king_zone_control(self, board, color):
-        king_sq = board.king(color)
-        zone = chess.SquareSet(chess.BB_KING_ATTACKS[king_sq])
-        control = sum(board.is_attacked_by(color, sq) for sq in zone)
-        return control
+    def get_king_zone_control(self, board, color, ctx=None):
+        ctx = ctx or FeatureContext(board)
+        return chess.popcount(chess.BB_KING_ATTACKS[board.king(color)] & ctx.attacks[color])
 
     def get_rook_on_7th_rank(self, board, color):
-        rank = 6 if color == chess.WHITE else 1
-        return sum(1 for sq in board.pieces(chess.ROOK, color) if chess.square_rank(sq) == rank)
+        seventh = chess.BB_RANK_7 if color == chess.WHITE else chess.BB_RANK_2
+        return chess.popcount(board.rooks & board.occupied_co[color] & seventh)
 
     def get_connected_rooks(self, board, color):
-        rooks = list(board.pieces(chess.ROOK, color))
-        return 1 if len(rooks) == 2 and board.is_attacked_by(color, rooks[0]) and board.is_attacked_by(color, rooks[1]) else 0
+        # exactly two rooks on a shared rank or file with nothing between them
+        rooks = board.rooks & board.occupied_co[color]
+        if chess.popcount(rooks) != 2:
+            return 0
+        a, b = chess.scan_forward(rooks)
+        aligned = SQUARE_FILES[a] == SQUARE_FILES[b] or SQUARE_RANKS[a] == SQUARE_RANKS[b]
+        return 1 if aligned and not chess.between(a, b) & board.occupied else 0
 
     def get_passed_pawn_advancement(self, board, color):
-        pawns = board.pieces(chess.PAWN, color)
-        advancement = 0
-        for sq in pawns:
-            if not any(board.piece_at(chess.square(chess.square_file(sq), r)) and
-                       board.piece_at(chess.square(chess.square_file(sq), r)).color != color
-                       for r in range(chess.square_rank(sq) + 1, 8)):
-                advancement += chess.square_rank(sq)
-        return advancement
+        enemies = board.occupied_co[not color]
+        return sum(SQUARE_RANKS[sq]
+                   for sq in chess.scan_forward(board.pawns & board.occupied_co[color])
+                   if not enemies & FRONT_SPAN_MASKS[sq])
 
     def get_pawn_shield(self, board, color):
-        king_sq = board.king(color)
-        rank = chess.square_rank(king_sq)
-        file = chess.square_file(king_sq)
-        front_rank = rank + 1 if color == chess.WHITE else rank - 1
-        files = [file - 1, file, file + 1]
-        shield = 0
-        for f in files:
-            if 0 <= f < 8 and 0 <= front_rank < 8:
-                sq = chess.square(f, front_rank)
-                piece = board.piece_at(sq)
-                if piece and piece.color == color and piece.piece_type == chess.PAWN:
-                    shield += 1
-        return shield
+        shield = PAWN_SHIELD_MASKS[color][board.king(color)]
+        return chess.popcount(shield & board.pawns & board.occupied_co[color])
 
     def get_backward_pawns(self, board, color):
-        pawns = board.pieces(chess.PAWN, color)
-        backward = 0
-        for p in pawns:
-            file = chess.square_file(p)
-            rank = chess.square_rank(p)
-            supporters = [chess.square(file - 1, rank - 1), chess.square(file + 1, rank - 1)]
-            if color == chess.BLACK:
-                supporters = [chess.square(file - 1, rank + 1), chess.square(file + 1, rank + 1)]
-            if all((s < 0 or s >= 64 or not board.piece_at(s) or board.piece_at(s).piece_type != chess.PAWN) for s in supporters):
-                backward += 1
-        return backward
+        # a pawn counts as supported by a pawn of either colour 7 or 9 squares behind it;
+        # like the original per-pawn check, the a/h-file edge is not masked off
+        pawns = board.pawns
+        if color == chess.WHITE:
+            supported = ((pawns << 7) | (pawns << 9)) & chess.BB_ALL
+        else:
+            supported = (pawns >> 7) | (pawns >> 9)
+        return chess.popcount(pawns & board.occupied_co[color] & ~supported)
 
     def get_isolated_weakness_clusters(self, board, color):
-        pawns = list(board.pieces(chess.PAWN, color))
-        files = [chess.square_file(p) for p in pawns]
-        clusters = 0
-        for f in set(files):
-            if all(abs(f - other) > 1 for other in set(files) if other != f):
-                clusters += 1
-        return clusters
+        return isolated_files(file_occupancy(board.pawns & board.occupied_co[color]))
 
     # -------------------------------
     # COLLECT ALL FEATURES
     # -------------------------------
-    def _extract_all_features(self, board):
+    def _extract_all_features(self, board, reuse=None):
+        # `reuse` carries group values over unchanged instead of recomputing them (see update_features)
+        reuse = reuse or {}
+
+        def per_side(name, getter):
+            if name in reuse:
+                return reuse[name]
+            return {"white": getter(board, chess.WHITE), "black": getter(board, chess.BLACK)}
+
         white_material, black_material = self.get_material(board)
+        material = {"white": white_material, "black": black_material}
+        ctx = FeatureContext(board)
+        mobility = self.get_mobility(board)
+        pawn_feats = self._pawn_king_feats(board)
+        threat_stats = self.get_threat_stats(board, ctx)
         return {
-            "material": {"white": white_material, "black": black_material},
-            "mobility": self.get_mobility(board),
-            "king_safety": {"white": self.get_king_safety(board, chess.WHITE), "black": self.get_king_safety(board, chess.BLACK)},
+            "material": material,
+            "mobility": mobility,
+            "king_safety": {"white": self.get_king_safety(board, chess.WHITE, ctx), "black": self.get_king_safety(board, chess.BLACK, ctx)},
             "pawn_structure": {"white": self.get_pawn_structure(board, chess.WHITE), "black": self.get_pawn_structure(board, chess.BLACK)},
-            "center_control": {"white": self.get_center_control(board, chess.WHITE), "black": self.get_center_control(board, chess.BLACK)},
-            "development": {"white": self.get_development(board, chess.WHITE), "black": self.get_development(board, chess.BLACK)},
-            "rook_activity": {"white": self.get_rook_activity(board, chess.WHITE), "black": self.get_rook_activity(board, chess.BLACK)},
-            "threats": {"white": self.get_hanging_pieces(board, chess.WHITE), "black": self.get_hanging_pieces(board, chess.BLACK)},
-            "piece_activity": {"white": self.get_piece_activity(board, chess.WHITE), "black": self.get_piece_activity(board, chess.BLACK)},
-            "piece_coordination": {"white": self.get_piece_coordination(board, chess.WHITE), "black": self.get_piece_coordination(board, chess.BLACK)},
-            "bishop_pair_bonus": {"white": self.get_bishop_pair_bonus(board, chess.WHITE), "black": self.get_bishop_pair_bonus(board, chess.BLACK)},
-            "open_file_control": {"white": self.get_open_file_control(board, chess.WHITE), "black": self.get_open_file_control(board, chess.BLACK)},
-            "space_advantage": {"white": self.get_space_advantage(board, chess.WHITE), "black": self.get_space_advantage(board, chess.BLACK)},
-            "weak_squares": {"white": self.get_weak_squares(board, chess.WHITE), "black": self.get_weak_squares(board, chess.BLACK)},
-            "outposts": {"white": self.get_outposts(board, chess.WHITE), "black": self.get_outposts(board, chess.BLACK)},
+            "center_control": {"white": self.get_center_control(board, chess.WHITE, ctx), "black": self.get_center_control(board, chess.BLACK, ctx)},
+            "development": per_side("development", self.get_development),
+            "rook_activity": per_side("rook_activity", self.get_rook_activity),
+            "threats": threat_stats["threats"],
+            "piece_activity": {"white": self.get_piece_activity(board, chess.WHITE, mobility), "black": self.get_piece_activity(board, chess.BLACK, mobility)},
+            "piece_coordination": threat_stats["piece_coordination"],
+            "bishop_pair_bonus": per_side("bishop_pair_bonus", self.get_bishop_pair_bonus),
+            "open_file_control": per_side("open_file_control", self.get_open_file_control),
+            "space_advantage": {"white": self.get_space_advantage(board, chess.WHITE, ctx), "black": self.get_space_advantage(board, chess.BLACK, ctx)},
+            "weak_squares": {"white": self.get_weak_squares(board, chess.WHITE, ctx), "black": self.get_weak_squares(board, chess.BLACK, ctx)},
+            "outposts": {"white": self.get_outposts(board, chess.WHITE, ctx), "black": self.get_outposts(board, chess.BLACK, ctx)},
             "pinned_pieces": {"white": self.get_pinned_pieces(board, chess.WHITE), "black": self.get_pinned_pieces(board, chess.BLACK)},
-            "attacked_vs_defended": {"white": self.get_attacked_vs_defended_balance(board, chess.WHITE), "black": self.get_attacked_vs_defended_balance(board, chess.BLACK)},
-            "castling_status": {"white": self.get_castling_status(board, chess.WHITE), "black": self.get_castling_status(board, chess.BLACK)},
-            "king_zone_control": {"white": self.get_king_zone_control(board, chess.WHITE), "black": self.get_king_zone_control(board, chess.BLACK)},
-            "rook_on_7th_rank": {"white": self.get_rook_on_7th_rank(board, chess.WHITE), "black": self.get_rook_on_7th_rank(board, chess.BLACK)},
-            "connected_rooks": {"white": self.get_connected_rooks(board, chess.WHITE), "black": self.get_connected_rooks(board, chess.BLACK)},
+            "attacked_vs_defended": threat_stats["attacked_vs_defended"],
+            "castling_status": per_side("castling_status", self.get_castling_status),
+            "king_zone_control": {"white": self.get_king_zone_control(board, chess.WHITE, ctx), "black": self.get_king_zone_control(board, chess.BLACK, ctx)},
+            "rook_on_7th_rank": per_side("rook_on_7th_rank", self.get_rook_on_7th_rank),
+            "connected_rooks": per_side("connected_rooks", self.get_connected_rooks),
             "passed_pawn_advancement": {"white": self.get_passed_pawn_advancement(board, chess.WHITE), "black": self.get_passed_pawn_advancement(board, chess.BLACK)},
-            "pawn_shield": {"white": self.get_pawn_shield(board, chess.WHITE), "black": self.get_pawn_shield(board, chess.BLACK)},
-            "backward_pawns": {"white": self.get_backward_pawns(board, chess.WHITE), "black": self.get_backward_pawns(board, chess.BLACK)},
-            "isolated_weakness_clusters": {"white": self.get_isolated_weakness_clusters(board, chess.WHITE), "black": self.get_isolated_weakness_clusters(board, chess.BLACK)}
+            "pawn_shield": pawn_feats["pawn_shield"],
+            "backward_pawns": pawn_feats["backward_pawns"],
+            "isolated_weakness_clusters": pawn_feats["isolated_weakness_clusters"]
         }
 
     def compare_features(self, f1, f2):
+        # one tuple compare settles the common no-change case; otherwise rebuild
+        # the nested diff from the slots that differ
+        v1, v2 = feature_values(f1), feature_values(f2)
+        if v1 == v2:
+            return {}
         diff = {}
-        for key in f2:
-            if key not in f1:
-                diff[key] = f2[key]
-                continue
-            val1 = f1[key]
-            val2 = f2[key]
-            if isinstance(val2, dict):
-                sub_diff = self.compare_features(val1, val2)
-                if sub_diff:
-                    diff[key] = sub_diff
-            else:
-                if val1 != val2:
-                    diff[key] = val2
+        for key, val1, val2 in zip(FEATURE_KEYS, v1, v2):
+            if val1 != val2:
+                node = diff
+                for part in key[:-1]:
+                    node = node.setdefault(part, {})
+                node[key[-1]] = val2
         return diff
 
-    def extract_features(self, curr, prev=None):
-        board2 = chess.Board(curr)
-        features2 = self._extract_all_features(board2)
+    # -------------------------------
+    # CACHED EXTRACTION
+    # -------------------------------
+    def _store(self, table, size, key, value):
+        if size <= 0:
+            return
+        if len(table) >= size:
+            del table[next(iter(table))]
+        table[key] = value
+
+    def _pawn_king_feats(self, board):
+        white, black = board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK]
+        key = (board.pawns & white, board.pawns & black, board.kings & white, board.kings & black)
+        features = self._pawn_tt.get(key)
+        if features is None:
+            features = {
+                "pawn_shield": {"white": self.get_pawn_shield(board, chess.WHITE), "black": self.get_pawn_shield(board, chess.BLACK)},
+                "backward_pawns": {"white": self.get_backward_pawns(board, chess.WHITE), "black": self.get_backward_pawns(board, chess.BLACK)},
+                "isolated_weakness_clusters": {"white": self.get_isolated_weakness_clusters(board, chess.WHITE), "black": self.get_isolated_weakness_clusters(board, chess.BLACK)},
+            }
+            self._store(self._pawn_tt, self.pawn_tt_size, key, features)
+        return features
+
+    def _position_key(self, fen):
+        # placement, side to move, castling, en passant — the clocks don't affect any feature
+        return " ".join(fen.split()[:4])
+
+    def _fen_feats(self, fen, prev=None, prev_features=None):
+        # prev/prev_features: a related position whose unchanged groups may be carried over on a miss
+        position = self._position_key(fen)
+        features = self._fen_cache.pop(position, None)
+        if features is not None:
+            # re-insert so a hit counts as recent use; eviction then drops the least recently used FEN
+            self._fen_cache[position] = features
+        else:
+            board = chess.Board(position)
+            key = chess.polyglot.zobrist_hash(board)
+            features = self._tt.get(key)
+            if features is None:
+                reuse = None
+                if prev_features is not None:
+                    reuse = self._unchanged_groups(prev_features, chess.Board(self._position_key(prev)), board)
+                features = self._extract_all_features(board, reuse)
+                self._store(self._tt, self.tt_size, key, features)
+            self._store(self._fen_cache, self.fen_cache_size, position, features)
+        return features
 
+    def extract_features(self, curr, prev=None):
         if prev:
-            board1 = chess.Board(prev)
-            features1 = self._extract_all_features(board1)
+            features1 = self._fen_feats(prev)
+            # only groups whose inputs differ between the two boards get recomputed for curr
+            features2 = self._fen_feats(curr, prev, features1)
             differences = self.compare_features(features1, features2)
             return differences
         else:
-            return features2
+            # the cached dict is shared, hand out a copy
+            return copy.deepcopy(self._fen_feats(curr))
+
+    # -------------------------------
+    # INCREMENTAL UPDATE
+    # -------------------------------
+    def update_features(self, prev_features, board, move):
+        # `board` is the position prev_features describes; returns the full features after `move`
+        after = board.copy(stack=False)
+        after.push(move)
+        key = chess.polyglot.zobrist_hash(after)
+        features = self._tt.get(key)
+        if features is None:
+            features = self._extract_all_features(after, self._unchanged_groups(prev_features, board, after))
+            self._store(self._tt, self.tt_size, key, features)
+        return copy.deepcopy(features)
+
+    def _unchanged_groups(self, prev_features, prev_board, board):
+        # groups whose input bitboards are identical on both boards, copied from prev_features
+        clean = [name for name, piece_types in PLACEMENT_GROUPS.items()
+                 if placement(prev_board, piece_types) == placement(board, piece_types)]
+        if prev_board.castling_rights == board.castling_rights:
+            clean.append("castling_status")
+        return {name: copy.deepcopy(prev_features[name]) for name in clean}
+
+    # -------------------------------
+    # FLAT VECTOR OUTPUT
+    # -------------------------------
+    def to_vector(self, features):
+        # float32 buffer laid out as FEATURE_KEYS; np.frombuffer(vec, np.float32) wraps it without a copy
+        return array("f", [CATEGORY_VALUES.get(value, value) for value in feature_values(features)])
+
+    def extract_vector(self, fen):
+        return self.to_vector(self._fen_feats(fen))
+
+    # -------------------------------
+    # BATCH EXTRACTION
+    # -------------------------------
+    def extract_features_batch(self, fens, max_workers=None, chunksize=None, cache_size=1024):
+        # one extractor (and transposition table) per worker process;
+        # FENs are shipped in chunks so per-task IPC doesn't swamp the work.
+        # Dataset FENs rarely repeat, so each worker's tables are capped at cache_size
+        # entries (0 disables them) instead of growing to the full tt_size.
+        fens = list(fens)
+        chunksize = chunksize or batch_chunksize(len(fens), max_workers)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(cache_size,)) as pool:
+            return list(pool.map(_extract_in_worker, fens, chunksize=chunksize))
+
+    def extract_columns_batch(self, fens, max_workers=None, chunksize=None, cache_size=1024):
+        # column layout for datasets: "_".join(key) -> float32 array over all fens,
+        # in input order; np.frombuffer wraps each column without a copy
+        fens = list(fens)
+        chunksize = chunksize or batch_chunksize(len(fens), max_workers)
+        columns = [array("f", bytes(4 * len(fens))) for _ in FEATURE_KEYS]
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(cache_size,)) as pool:
+            for row, vec in enumerate(pool.map(_vector_in_worker, fens, chunksize=chunksize)):
+                for column, value in zip(columns, vec):
+                    column[row] = value
+        return dict(zip(FEATURE_INDEX, columns))
+
+
+def batch_chunksize(n, max_workers=None):
+    # about eight chunks per worker: few enough to amortise IPC, enough to even out slow shards
+    workers = max_workers or os.cpu_count() or 1
+    return max(1, n // (8 * workers))
+
+
+_worker_extractor = None
+
+
+def _init_worker(cache_size):
+    global _worker_extractor
+    _worker_extractor = ChessFeatureExtractor()
+    _worker_extractor.tt_size = _worker_extractor.fen_cache_size = cache_size
+    _worker_extractor.pawn_tt_size = min(cache_size, ChessFeatureExtractor.pawn_tt_size)
+
+
+def _extract_in_worker(fen):
+    return _worker_extractor.extract_features(fen)
+
+
+def _vector_in_worker(fen):
+    return _worker_extractor.extract_vector(fen)
+
+
+def pretty_print(features):
+    # human-readable dump; keep it out of extraction loops
+    for k, v in features.items():
+        print(f"- {k}: {v}")
 
 
 # ==============================================================  
@@ -321,8 +584,7 @@ if __name__ == "__main__":
     extractor = ChessFeatureExtractor()
 
     f2 = extractor.extract_features(curr=curr_fen, prev=prev_fen)
-    for k, v in f2.items():
-        print(f"- {k}: {v}")
+    pretty_print(f2)
 
 
 